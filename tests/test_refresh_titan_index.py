@@ -0,0 +1,120 @@
+import sys, unittest
+from pathlib import Path
+
+from lxml import html as lxml_html
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+import refresh_titan_index as rti
+
+HEAD = "<thead><tr><th>Indicator</th><th>Feb 1</th><th>Aug 1</th><th>Sep 1</th><th>Overall (vs Feb 1)</th></tr></thead>"
+DJIA_ROW = "<tr><td>DJIA</td><td>38500</td><td>36200</td><td>—</td><td>—</td></tr>"
+TABLE = f"<table>{HEAD}<tbody>{DJIA_ROW}</tbody></table>"
+
+# Cells as the baseline BeautifulSoup script leaves them for DJIA_ROW: the Sep
+# value lands one column left (under Aug 1) and the Overall write goes to the
+# Sep 1 column.
+DJIA_UPDATED = ["DJIA", "38500", "🟢 45621.29", "—", "—"]
+
+def page(body):
+    return f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"/></head><body>\n{body}\n</body></html>"
+
+def cells(html, indicator):
+    # text of each direct <td> in the (single) row whose first cell is `indicator`
+    rows = [tr for tr in lxml_html.fromstring(html).iter("tr")
+            if tr.findall("td") and rti.text_of(tr.findall("td")[0]) == indicator]
+    assert len(rows) == 1, f"{len(rows)} rows for {indicator!r}"
+    return [rti.text_of(td) for td in rows[0].findall("td")]
+
+class UpdateIndexTests(unittest.TestCase):
+    def assert_balanced(self, html):
+        self.assertEqual(html.count("<table"), html.count("</table>"))
+
+    def test_flat_table_is_updated_in_place(self):
+        out = rti.update_index(page(TABLE))
+        self.assertEqual(cells(out, "DJIA"), DJIA_UPDATED)
+        self.assertTrue(out.startswith("<!DOCTYPE html>\n<html><head>"))
+
+    def test_sep_column_is_inserted_before_overall(self):
+        head = "<thead><tr><th>Indicator</th><th>Feb 1</th><th>Aug 1</th><th>Overall (vs Feb 1)</th></tr></thead>"
+        rows = ("<tr><td>DJIA</td><td>38500</td><td>36200</td><td>🟥 -2300</td></tr>"
+                "<tr><td>Unemployment Rate (%)</td><td>3.7</td><td>4.3</td><td>🟥 +0.6</td></tr>")
+        out = rti.update_index(page(f"<table>{head}<tbody>{rows}</tbody></table>"))
+        self.assertIn("<th>Aug 1</th><th>Sep 1</th><th>Overall (vs Feb 1)</th>", out)
+        self.assertEqual(cells(out, "DJIA"), ["DJIA", "38500", "🟢 45621.29", "—", "🟥 -2300"])
+        self.assertEqual(cells(out, "Unemployment Rate (%)"), ["Unemployment Rate (%)", "3.7", "🟥 4.3", "—", "🟥 +0.6"])
+
+    def test_table_inside_layout_table(self):
+        out = rti.update_index(page(f"<table><tr><td>{TABLE}</td></tr></table>"))
+        self.assertEqual(cells(out, "DJIA"), DJIA_UPDATED)
+        self.assert_balanced(out)
+
+    def test_table_with_nested_table_in_a_cell(self):
+        row = "<tr><td>DJIA</td><td>38500</td><td>36200</td><td>—</td><td><table><tr><td>x</td></tr></table></td></tr>"
+        out = rti.update_index(page(f"<table>{HEAD}<tbody>{row}</tbody></table><p>after</p>"))
+        self.assertEqual(cells(out, "DJIA"), DJIA_UPDATED[:4] + ["x"])
+        self.assert_balanced(out)
+        self.assertEqual(out.count("</tbody>"), 1)
+        self.assertIn("</table><p>after</p>", out)
+
+    def test_unclosed_table(self):
+        out = rti.update_index(page(f"<table>{HEAD}<tbody>{DJIA_ROW}</tbody>"))
+        self.assertEqual(cells(out, "DJIA"), DJIA_UPDATED)
+        self.assert_balanced(out)
+
+    def test_table_without_tbody_updates_first_body_row(self):
+        out = rti.update_index(page(f"<table>{HEAD}{DJIA_ROW}</table>"))
+        self.assertEqual(cells(out, "DJIA"), DJIA_UPDATED)
+
+    def test_rows_in_every_tbody_are_updated(self):
+        nasdaq = DJIA_ROW.replace("DJIA", "NASDAQ").replace("38500", "15500").replace("36200", "15800")
+        out = rti.update_index(page(f"<table>{HEAD}<tbody>{DJIA_ROW}</tbody><tbody>{nasdaq}</tbody></table>"))
+        self.assertEqual(cells(out, "DJIA"), DJIA_UPDATED)
+        self.assertEqual(cells(out, "NASDAQ"), ["NASDAQ", "15500", "🟢 21707.69", "—", "—"])
+
+    def test_alias_rows_get_the_sept_value(self):
+        name = "Consumer Confidence Index"
+        out = rti.update_index(page(f"<table>{HEAD}<tbody>{DJIA_ROW.replace('DJIA', name)}</tbody></table>"))
+        self.assertEqual(cells(out, name), [name, "38500", "🟥 97.4", "—", "—"])
+
+    def test_table_markup_in_comment_and_script_is_left_alone(self):
+        comment = f"<!-- old: {TABLE} -->"
+        script = "<script>const t = '<table><tr><td>x</td></tr></table>';</script>"
+        out = rti.update_index(page(comment + script + TABLE))
+        self.assertEqual(cells(out, "DJIA"), DJIA_UPDATED)
+        self.assertEqual(out.count("45621.29"), 1)
+        self.assertIn(comment + script + "<table>", out)
+
+    def test_whos_better_list_with_nested_list_is_replaced_whole(self):
+        section = ("<h3>Who’s Better vs. Worse?</h3>"
+                   "<ul><li>a<ul><li>b</li></ul></li><li>c</li></ul><p>after</p>")
+        out = rti.update_index(page(section))
+        self.assertIn(rti.WHOS_BETTER_UL + "<p>after</p>", out)
+        self.assertNotIn("<li>c</li>", out)
+        self.assertIn('style="color:#fbbf24;"', out)
+
+    def test_whos_better_list_inside_an_edited_table(self):
+        section = "<h3>Who’s Better vs. Worse?</h3><ul><li>old</li></ul>"
+        cell = DJIA_ROW.replace("<td>—</td></tr>", f"<td>{section}</td></tr>")
+        out = rti.update_index(page(f"<table>{HEAD}<tbody>{cell}</tbody></table>"))
+        self.assertEqual(cells(out, "DJIA")[:4], DJIA_UPDATED[:4])
+        self.assertEqual(out.count("Upper class"), 1)
+        self.assertNotIn("<li>old</li>", out)
+
+    def test_table_inside_whos_better_heading_is_kept(self):
+        out = rti.update_index(page("<h3>Who's Better vs. Worse? " + TABLE + "</h3><ul><li>o</li></ul>"))
+        self.assertEqual(cells(out, "DJIA"), DJIA_UPDATED)
+        self.assertEqual(out.count("Upper class"), 1)
+        self.assertNotIn("<li>o</li>", out)
+
+class ParseJsArrayTests(unittest.TestCase):
+    def test_single_quoted_labels(self):
+        self.assertEqual(rti.parse_js_array("['Feb 1', 'Mar 1']"), ["Feb 1", "Mar 1"])
+
+    def test_quote_inside_double_quoted_label_is_not_a_separator(self):
+        self.assertEqual(rti.parse_js_array('''["x','y"]'''), ["x','y"])
+
+    def test_numbers_and_null(self):
+        self.assertEqual(rti.parse_js_array("[38500.0, null, 3]"), [38500.0, None, 3])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,10 @@
-import zipfile, os, re, sys, uuid
+import zipfile, io, re, sys, time, json, functools
 from pathlib import Path
 
 try:
-    from bs4 import BeautifulSoup
+    from lxml import html as lxml_html
 except ImportError:
-    print("Missing dependency: beautifulsoup4")
+    print("Missing dependency: lxml")
     sys.exit(1)
 
 # ---- Inputs/Outputs (filenames matter) ----
@@ -44,19 +44,40 @@ ALIASES = {
     "30-year fixed mortgage rate (%)": "30-Year Mortgage Rate (%)",
 }
 
-def norm(s): return re.sub(r"\s+"," ", (s or "")).strip().lower()
+WHOS_BETTER_UL = (
+    '<ul style="margin:8px 0 0 18px;line-height:1.5;">'
+    '<li>💎 <strong>Upper class — Better off:</strong> Stock gains and property wealth buffer higher costs; mortgage swings matter less.</li>'
+    '<li>🏠 <strong>Middle class — Squeezed:</strong> Paychecks up but affordability tight: elevated home prices, ~7% mortgages, and essential costs bite.</li>'
+    '<li>💸 <strong>Lower class — Worse off:</strong> Little benefit from markets; rents, gas, and groceries weigh most even with strong job availability.</li>'
+    '</ul>'
+)
 
+# ---- Regexes, compiled once and reused across cells and chart files ----
+_WS_RE     = re.compile(r"\s+")
+_NUM_RE    = re.compile(r"[-+]?\d*\.?\d+")
+_LABELS_RE = re.compile(r"const\s+labels\s*=\s*(\[[^\]]*\])\s*;")
+_ACTUAL_RE = re.compile(r"const\s+actual\s*=\s*(\[[^\]]*\])\s*;")
+
+@functools.lru_cache(maxsize=512)
+def norm(s): return _WS_RE.sub(" ", (s or "")).strip().lower()
+
+# normalised indicator name -> SEPT key (exact names win over aliases)
+_KEY_INDEX = {norm(a): v for a, v in ALIASES.items()}
+_KEY_INDEX.update({norm(k): k for k in SEPT})
+
+@functools.lru_cache(maxsize=4096)
 def parse_num(txt):
     if txt is None: return None
     t = str(txt)
     if "—" in t: return None
     t = t.replace("🟥","").replace("🟢","").replace("➖","")
     t = t.replace("$","").replace("%","").replace(",","").strip()
-    m = re.search(r"[-+]?\d*\.?\d+", t)
+    m = _NUM_RE.search(t)
     return float(m.group(0)) if m else None
 
 def fmt(x): return f"{x:.2f}".rstrip("0").rstrip(".")
 
+@functools.lru_cache(maxsize=512)
 def good_when_down(ind_name):
     n = norm(ind_name)
     if n in GOOD_WHEN_DOWN: return True
@@ -64,20 +85,43 @@ def good_when_down(ind_name):
     if any(k in n for k in ["price","rate","mortgage","ratio"]): return True
     return False
 
+# indexed by 2*good + flat: worse, flat, good, good (a good move is never "flat")
+_TREND = ("🟥", "➖", "🟢", "🟢")
+
+def trend_emoji(delta, down_is_good):
+    good = (delta < 0) if down_is_good else (delta > 0)
+    return _TREND[2 * good + (abs(delta) < 1e-9)]
+
 def map_key(nname):
-    for k in SEPT:
-        if norm(k) == nname: return k
-    return ALIASES.get(nname)
+    return _KEY_INDEX.get(nname)
 
 def read_series(content):
-    m_labels = re.search(r"const\s+labels\s*=\s*(\[[^\]]*\])\s*;", content)
-    m_actual = re.search(r"const\s+actual\s*=\s*(\[[^\]]*\])\s*;", content)
+    m_labels = _LABELS_RE.search(content)
+    m_actual = _ACTUAL_RE.search(content)
     return (m_labels.group(1), m_actual.group(1)) if (m_labels and m_actual) else (None, None)
 
+def split_top_level(inner):
+    # split on commas that are outside nested brackets and quoted strings
+    parts, depth, quote, start = [], 0, None, 0
+    for i, c in enumerate(inner):
+        if quote:
+            if c == quote and inner[i-1] != "\\": quote = None
+        elif c in "'\"": quote = c
+        elif c in "[{": depth += 1
+        elif c in "]}": depth -= 1
+        elif c == "," and depth == 0:
+            parts.append(inner[start:i]); start = i + 1
+    parts.append(inner[start:])
+    return parts
+
 def parse_js_array(js_array_str):
+    # Numeric arrays are already JSON; anything json rejects (single-quoted
+    # labels, bare names) goes through the quote-aware scanner instead.
+    try: return json.loads(js_array_str)
+    except ValueError: pass
     inner = js_array_str.strip()[1:-1].strip()
     if not inner: return []
-    parts = re.split(r',(?![^\\[\\]]*\\])', inner)
+    parts = split_top_level(inner)
     out = []
     for p in parts:
         s = p.strip()
@@ -89,190 +133,197 @@ def parse_js_array(js_array_str):
     return out
 
 def to_js_array(lst):
-    def conv(x):
-        if x is None: return "null"
-        if isinstance(x, str): return '"' + x.replace('"','\\"') + '"'
-        if isinstance(x, float) and x.is_integer(): return str(int(x))
-        return str(x)
-    return "[" + ", ".join(conv(x) for x in lst) + "]"
+    lst = [int(x) if isinstance(x, float) and x.is_integer() else x for x in lst]
+    return json.dumps(lst, ensure_ascii=False, separators=(", ", ": "))
+
+# ---- Chart filename (without .html, lowercased) -> indicator ----
+_EXACT = {
+    "djia": "DJIA",
+    "nasdaq": "NASDAQ",
+    "s&p-500": "S&P 500", "s&p 500": "S&P 500", "s&p_500": "S&P 500",
+}
+_PREFIXES = [("30-year-mortgage-rate-", "30-Year Mortgage Rate (%)")]
+_SUBSTRINGS = [
+    ("unemployment", "Unemployment Rate (%)"),
+    ("consumer-confidence", "Consumer Confidence"),
+    ("presidential-approval", "Presidential Approval (%)"),
+    ("avg-home-price", "Avg Home Price ($)"),
+    ("average-home-price", "Avg Home Price ($)"),
+    ("avg-gas-price", "Avg Gas Price ($/gal)"),
+    ("big-mac", "Big Mac ($)"),
+    ("milk", "Milk ($/gal)"),
+    ("eggs", "Eggs ($/dozen)"),
+]
 
 def indicator_from_filename(fn):
-    base = fn.replace(".html","").lower()
-    if base.startswith("30-year-mortgage-rate-"): return "30-Year Mortgage Rate (%)"
-    if base == "djia": return "DJIA"
-    if base == "nasdaq": return "NASDAQ"
-    if base in ["s&p-500","s&p 500","s&p_500"]: return "S&P 500"
-    if "unemployment" in base: return "Unemployment Rate (%)"
-    if "consumer-confidence" in base: return "Consumer Confidence"
-    if "presidential-approval" in base: return "Presidential Approval (%)"
-    if "avg-home-price" in base or "average-home-price" in base: return "Avg Home Price ($)"
-    if "avg-gas-price" in base: return "Avg Gas Price ($/gal)"
-    if "big-mac" in base: return "Big Mac ($)"
-    if "milk" in base: return "Milk ($/gal)"
-    if "eggs" in base: return "Eggs ($/dozen)"
-    return None
-
-def main():
-    if not BASELINE_ZIP.exists():
-        print("ERROR: Baseline ZIP missing in repo root:", BASELINE_ZIP)
-        sys.exit(1)
-
-    work_dir = Path(f"_titan_index_build_{uuid.uuid4().hex[:6]}")
-    work_dir.mkdir(parents=True, exist_ok=True)
-
-    with zipfile.ZipFile(BASELINE_ZIP, "r") as z:
-        z.extractall(work_dir)
-
-    index_path = work_dir / "index.html"
-    charts_dir = work_dir / "charts"
-    if not index_path.exists():
-        print("ERROR: index.html not found inside baseline ZIP.")
-        sys.exit(1)
-
+    base = fn.lower().removesuffix(".html")
+    return (_EXACT.get(base)
+            or next((v for p, v in _PREFIXES if base.startswith(p)), None)
+            or next((v for sub, v in _SUBSTRINGS if sub in base), None))
+
+def text_of(el, sep=" "):
+    # stripped text of el and its descendants, like bs4's get_text(sep, strip=True)
+    return sep.join(s.strip() for s in el.itertext() if s.strip())
+
+def set_text(el, text):
+    for child in list(el): el.remove(child)
+    el.text = text
+
+def splice(html, edits):
+    # replace non-overlapping (start, end, frag) ranges in one pass; untouched
+    # source between them is copied through as-is
+    out, pos = [], 0
+    for start, end, frag in sorted(edits):
+        if start < pos: raise ValueError(f"overlapping splice at {start}")
+        out += (html[pos:start], frag)
+        pos = end
+    out.append(html[pos:])
+    return "".join(out)
+
+def is_chart(name):
+    return name.startswith("charts/") and name.endswith(".html") and name.count("/") == 1
+
+def patch_chart(content, fn):
+    # add a Sep 1 point to the chart's labels/actual arrays
+    m_labels = _LABELS_RE.search(content)
+    m_actual = _ACTUAL_RE.search(content)
+    if not m_labels or not m_actual: return content
+    labels = parse_js_array(m_labels.group(1))
+    actual = parse_js_array(m_actual.group(1))
+    if "Sep 1" not in labels: labels.append("Sep 1")
+    ind_key = indicator_from_filename(fn)
+    val = float(SEPT[ind_key]) if ind_key in SEPT else None
+    while len(actual) < len(labels) - 1: actual.append(None)
+    if len(actual) == len(labels) - 1: actual.append(val)
+    else: actual[-1] = val
+    # reuse the match offsets rather than re-scanning the file with re.sub
+    return splice(content, [(*m_labels.span(1), to_js_array(labels)),
+                            (*m_actual.span(1), to_js_array(actual))])
+
+# payloads that are already compressed gain nothing from another deflate pass
+_STORED_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".woff", ".woff2", ".zip", ".gz")
+
+def compress_type_for(name):
+    return zipfile.ZIP_STORED if name.lower().endswith(_STORED_SUFFIXES) else zipfile.ZIP_DEFLATED
+
+def update_index(html):
     # ---- Update tables with Sep 1 + values + emojis + Overall
-    html = index_path.read_text(encoding="utf-8", errors="ignore")
-    soup = BeautifulSoup(html, "html.parser")
-
-    for table in soup.find_all("table"):
-        thead = table.find("thead")
-        if not thead: continue
-        headers = [th.get_text(" ", strip=True) for th in thead.find_all("th")]
-        if not headers or norm(headers[0]) != "indicator": continue
+    # One lxml parse, edits made on the tree, one serialisation at the end.
+    tree = lxml_html.fromstring(html)
+
+    for table in tree.iter("table"):
+        thead = table.find(".//thead")
+        if thead is None: continue
+        headers = [text_of(th) for th in thead.iter("th")]
+        headers_norm = [norm(h) for h in headers]
+        if not headers or headers_norm[0] != "indicator": continue
+        # body rows: direct rows of every tbody, plus any placed straight in
+        # the table (the header row is inside thead either way)
+        rows = table.xpath("./tbody/tr | ./tr")
 
         if "Sep 1" not in headers:
-            overall_idx = next((i for i,h in enumerate(headers) if norm(h).startswith("overall")), None)
-            sep_th = soup.new_tag("th"); sep_th.string = "Sep 1"
+            overall_idx = next((i for i,h in enumerate(headers_norm) if h.startswith("overall")), None)
+            head_tr = next(thead.iter("tr"))
+            sep_th = lxml_html.Element("th"); sep_th.text = "Sep 1"
             if overall_idx is not None:
-                thead.find_all("tr")[0].find_all("th")[overall_idx].insert_before(sep_th)
+                head_tr.findall("th")[overall_idx].addprevious(sep_th)
             else:
-                thead.find_all("tr")[0].append(sep_th)
-            for tr in table.find("tbody").find_all("tr"):
-                new_td = soup.new_tag("td"); new_td.string = "—"
+                head_tr.append(sep_th)
+            for tr in rows:
+                new_td = lxml_html.Element("td"); new_td.text = "—"
                 if overall_idx is not None:
-                    tr.find_all("td")[overall_idx-1].insert_after(new_td)
+                    tr.findall("td")[overall_idx-1].addnext(new_td)
                 else:
                     tr.append(new_td)
 
-        headers = [th.get_text(" ", strip=True) for th in thead.find_all("th")]
+        headers = [text_of(th) for th in thead.iter("th")]
+        headers_norm = [norm(h) for h in headers]
         sep_idx = headers.index("Sep 1")
         feb_idx = headers.index("Feb 1") if "Feb 1" in headers else 1
         aug_idx = headers.index("Aug 1") if "Aug 1" in headers else None
-        overall_idx = next((i for i,h in enumerate(headers) if norm(h).startswith("overall")), None)
+        overall_idx = next((i for i,h in enumerate(headers_norm) if h.startswith("overall")), None)
 
-        for tr in table.find_all("tr")[1:]:
-            tds = tr.find_all("td")
+        for tr in rows:
+            tds = tr.findall("td")
             if not tds: continue
-            ind_name = tds[0].get_text(" ", strip=True)
-            key = map_key(norm(ind_name))
+            ind_name = text_of(tds[0])
+            down_is_good = good_when_down(ind_name)
+            val = SEPT.get(map_key(norm(ind_name)))
 
             if sep_idx-1 < len(tds):
-                if key and key in SEPT:
-                    val = SEPT[key]
-                    aug_val = parse_num(tds[aug_idx-1].get_text(" ", strip=True)) if (aug_idx and aug_idx-1 < len(tds)) else None
+                if val is not None:
+                    aug_val = parse_num(text_of(tds[aug_idx-1])) if (aug_idx and aug_idx-1 < len(tds)) else None
                     emoji = "➖"
                     if aug_val is not None:
                         delta = val - aug_val
-                        emoji = "🟢" if ((delta < 0) if good_when_down(ind_name) else (delta > 0)) else ("➖" if abs(delta) < 1e-9 else "🟥")
-                    tds[sep_idx-1].string = f"{emoji} {fmt(val)}"
+                        emoji = trend_emoji(delta, down_is_good)
+                    set_text(tds[sep_idx-1], f"{emoji} {fmt(val)}")
 
             if overall_idx is not None and overall_idx-1 < len(tds):
-                feb_val = parse_num(tds[feb_idx-1].get_text(" ", strip=True)) if feb_idx-1 < len(tds) else None
-                latest_val = parse_num(tds[sep_idx-1].get_text(" ", strip=True)) if sep_idx-1 < len(tds) else None
+                feb_val = parse_num(text_of(tds[feb_idx-1])) if feb_idx-1 < len(tds) else None
+                latest_val = parse_num(text_of(tds[sep_idx-1])) if sep_idx-1 < len(tds) else None
                 if latest_val is None or feb_val is None:
-                    tds[overall_idx-1].string = "—"
+                    set_text(tds[overall_idx-1], "—")
                 else:
                     diff = latest_val - feb_val
-                    emoji_over = "🟢" if ((diff < 0) if good_when_down(ind_name) else (diff > 0)) else ("➖" if abs(diff) < 1e-9 else "🟥")
+                    emoji_over = trend_emoji(diff, down_is_good)
                     sign = "+" if diff > 0 else ""
-                    tds[overall_idx-1].string = f"{emoji_over} {sign}{fmt(diff)}"
-
-    index_path.write_text(str(soup), encoding="utf-8")
+                    set_text(tds[overall_idx-1], f"{emoji_over} {sign}{fmt(diff)}")
 
     # ---- Update Who's Better vs Worse
-    soup2 = BeautifulSoup(index_path.read_text(encoding="utf-8"), "html.parser")
     header = None
-    for h in soup2.find_all(["h2","h3","h4"]):
-        t = (h.get_text(strip=True) or "").lower().replace("’","'")
+    for h in tree.iter("h2","h3","h4"):
+        t = text_of(h, "").lower().replace("’","'")
         if "who's better vs. worse" in t or "who’s better vs. worse" in t:
             header = h; break
-    if header:
-        ul = header.find_next("ul")
-        new_ul = soup2.new_tag("ul")
-        new_ul['style'] = 'margin:8px 0 0 18px;line-height:1.5;'
-        new_ul.append(BeautifulSoup('<li>💎 <strong>Upper class — Better off:</strong> Stock gains and property wealth buffer higher costs; mortgage swings matter less.</li>', "html.parser"))
-        new_ul.append(BeautifulSoup('<li>🏠 <strong>Middle class — Squeezed:</strong> Paychecks up but affordability tight: elevated home prices, ~7% mortgages, and essential costs bite.</li>', "html.parser"))
-        new_ul.append(BeautifulSoup('<li>💸 <strong>Lower class — Worse off:</strong> Little benefit from markets; rents, gas, and groceries weigh most even with strong job availability.</li>', "html.parser"))
-        if ul: ul.replace_with(new_ul)
-        else: header.insert_after(new_ul)
+    if header is not None:
         if "color:" not in (header.get("style","")):
-            header["style"] = (header.get("style","") + " color:#fbbf24;").strip()
-
-    index_path.write_text(str(soup2), encoding="utf-8")
-
-    # ---- Update charts with a Sep 1 point
-    def patch_chart(fpath):
-        content = fpath.read_text(encoding="utf-8", errors="ignore")
-        m_labels = re.search(r"const\s+labels\s*=\s*(\[[^\]]*\])\s*;", content)
-        m_actual = re.search(r"const\s+actual\s*=\s*(\[[^\]]*\])\s*;", content)
-        if not m_labels or not m_actual: return
-        def parse_js_array(js):
-            inner = js.strip()[1:-1].strip()
-            if not inner: return []
-            parts = re.split(r',(?![^\\[\\]]*\\])', inner)
-            out = []
-            for p in parts:
-                s = p.strip()
-                if s.lower() == "null": out.append(None)
-                elif s.startswith(("'", '"')) and s.endswith(("'", '"')): out.append(s[1:-1])
-                else:
-                    try: out.append(float(s))
-                    except: out.append(s)
-            return out
-        def to_js_array(lst):
-            def conv(x):
-                if x is None: return "null"
-                if isinstance(x, str): return '"' + x.replace('"','\\"') + '"'
-                if isinstance(x, float) and x.is_integer(): return str(int(x))
-                return str(x)
-            return "[" + ", ".join(conv(x) for x in lst) + "]"
-        labels = parse_js_array(m_labels.group(1))
-        actual = parse_js_array(m_actual.group(1))
-        if "Sep 1" not in labels: labels.append("Sep 1")
-        # map filename to indicator
-        base = fpath.name.replace(".html","").lower()
-        ind_key = None
-        if base.startswith("30-year-mortgage-rate-"): ind_key = "30-Year Mortgage Rate (%)"
-        elif base == "djia": ind_key = "DJIA"
-        elif base == "nasdaq": ind_key = "NASDAQ"
-        elif base in ["s&p-500","s&p 500","s&p_500"]: ind_key = "S&P 500"
-        elif "unemployment" in base: ind_key = "Unemployment Rate (%)"
-        elif "consumer-confidence" in base: ind_key = "Consumer Confidence"
-        elif "presidential-approval" in base: ind_key = "Presidential Approval (%)"
-        elif "avg-home-price" in base or "average-home-price" in base: ind_key = "Avg Home Price ($)"
-        elif "avg-gas-price" in base: ind_key = "Avg Gas Price ($/gal)"
-        elif "big-mac" in base: ind_key = "Big Mac ($)"
-        elif "milk" in base: ind_key = "Milk ($/gal)"
-        elif "eggs" in base: ind_key = "Eggs ($/dozen)"
-        val = float(SEPT[ind_key]) if ind_key in SEPT else None
-        while len(actual) < len(labels) - 1: actual.append(None)
-        if len(actual) == len(labels) - 1: actual.append(val)
-        else: actual[-1] = val
-        new_c = re.sub(r"const\s+labels\s*=\s*\[[^\]]*\]\s*;", f"const labels = {to_js_array(labels)};", content, count=1)
-        new_c = re.sub(r"const\s+actual\s*=\s*\[[^\]]*\]\s*;", f"const actual = {to_js_array(actual)};", new_c, count=1)
-        fpath.write_text(new_c, encoding="utf-8")
-
-    charts_dir = Path(work_dir/"charts")
-    if charts_dir.exists():
-        for f in charts_dir.glob("*.html"):
-            patch_chart(f)
+            header.set("style", (header.get("style","") + " color:#fbbf24;").strip())
+        ul = next(iter(header.xpath("following::ul[1]")), None)
+        new_ul = lxml_html.fragment_fromstring(WHOS_BETTER_UL)
+        if ul is not None:
+            new_ul.tail = ul.tail
+            ul.getparent().replace(ul, new_ul)
+        else:
+            header.addnext(new_ul)
+
+    return lxml_html.tostring(tree.getroottree(), encoding="unicode")
+
+def main():
+    if not BASELINE_ZIP.exists():
+        print("ERROR: Baseline ZIP missing in repo root:", BASELINE_ZIP)
+        sys.exit(1)
+
+    # one read for the whole archive; member reads below are then in-memory seeks
+    with zipfile.ZipFile(io.BytesIO(BASELINE_ZIP.read_bytes()), "r") as src:
+        infos = src.infolist()
+        files = {info.filename: src.read(info) for info in infos}
+    if "index.html" not in files:
+        print("ERROR: index.html not found inside baseline ZIP.")
+        sys.exit(1)
+
+    # ---- Edit index.html and charts/*.html in memory; nothing is extracted
+    # to disk, and a failed edit leaves any previous OUT_ZIP untouched.
+    edited = {"index.html": update_index(files["index.html"].decode("utf-8", errors="ignore"))}
+    for name, data in files.items():
+        if is_chart(name):
+            edited[name] = patch_chart(data.decode("utf-8", errors="ignore"), name.rsplit("/", 1)[-1])
 
     # ---- Package final ZIP
     if OUT_ZIP.exists(): OUT_ZIP.unlink()
-    with zipfile.ZipFile(OUT_ZIP, "w", zipfile.ZIP_DEFLATED) as z:
-        for root, _, files in os.walk(work_dir):
-            for name in files:
-                p = Path(root) / name
-                z.write(p, arcname=str(p.relative_to(work_dir)))
+    now = time.localtime()[:6]
+    # level 1: members are small HTML files where deflate setup, not ratio, dominates
+    with open(OUT_ZIP, "wb", buffering=1 << 20) as fh, \
+         zipfile.ZipFile(fh, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as dst:
+        for info in infos:
+            if info.filename in edited:
+                zi = zipfile.ZipInfo(info.filename, now)
+                data = edited[info.filename].encode("utf-8")
+            else:
+                zi = zipfile.ZipInfo(info.filename, info.date_time)
+                data = files[info.filename]
+            zi.external_attr = info.external_attr
+            dst.writestr(zi, data, compress_type=compress_type_for(info.filename), compresslevel=1)
     print("Built:", OUT_ZIP.resolve())
 
 if __name__ == "__main__":